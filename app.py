@@ -1,7 +1,13 @@
 from flask import Flask, request, jsonify, render_template
 from flask_cors import CORS
 import os
-from coordinator_agent import CoordinatorAgent
+from coordinator_agent import CoordinatorAgent, STAGE_EXECUTOR, build_report
+from concurrent.futures import TimeoutError as FutureTimeout
+from utils.deadline import Deadline
+from utils.analysis_cache import AnalysisCache, parse_refresh_intervals
+from utils.prewarm import PrewarmScheduler, load_watchlist, parse_hours
+from utils.chart_data import build_chart_payload
+from utils.nlp_tools import competitor_index
 import json
 import yfinance as yf
 import pandas as pd
@@ -11,6 +17,17 @@ app = Flask(__name__)
 CORS(app)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
 
+# Last good analysis per company, refreshed per section on its own interval
+analysis_cache = AnalysisCache(
+    refresh_intervals=parse_refresh_intervals(os.environ.get("PRELYTICS_REFRESH_INTERVALS"))
+)
+
+# Default end-to-end latency budget (seconds) for interactive analyses
+LATENCY_BUDGET = float(os.environ.get("PRELYTICS_LATENCY_BUDGET", "45"))
+
+# Price history range for the financial charts (a yfinance period such as "1y" or "5y")
+CHART_PERIOD = os.environ.get("PRELYTICS_CHART_PERIOD", "1y")
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -28,29 +45,122 @@ def analyze():
         if not company_name or not company_url:
             return jsonify({'error': 'Company name and URL are required'}), 400
         
-        print(f"[API] Starting analysis for {company_name} - {company_url}")
+        budget = parse_latency_budget(data.get('latency_budget'))
+        if budget is None:
+            return jsonify({'error': 'latency_budget must be a positive number of seconds'}), 400
         
-        # Run the analysis using the existing coordinator agent
-        agent = CoordinatorAgent(company_name, company_url)
-        results = agent.run_workflow()
+        # Serve the last good result right away and revalidate in the background
+        cached = analysis_cache.get(company_name, company_url)
+        if cached and not data.get('refresh'):
+            stale = analysis_cache.stale_sections(company_name, company_url)
+            if stale:
+                prewarm_scheduler.trigger_refresh(company_name, company_url, stale)
+            print(f"[API] Serving cached analysis for {company_name} (stale sections: {stale})")
+            return jsonify({
+                **build_payload(cached['sections'], cached['financial_charts'], cached['degraded']),
+                'cached': True,
+                'stale': bool(stale),
+                'updated_at': cached['updated_at']
+            })
         
-        # Parse the results into sections
-        sections = parse_results(results)
+        print(f"[API] Starting analysis for {company_name} - {company_url}")
+        payload, agent = run_analysis(company_name, company_url, budget=budget)
         
-        # Add financial chart data
-        financial_data = generate_financial_chart_data(company_name)
+        # Complete the degraded sections in the background for the next lookup,
+        # leaving out stages whose overrunning worker is still busy; charts are
+        # rebuilt along with the financial section
+        refresh = list(dict.fromkeys(
+            'financial' if section == 'financial_charts' else section
+            for section in agent.degraded if section not in agent.running_stages
+        ))
+        if refresh:
+            prewarm_scheduler.trigger_refresh(company_name, company_url, refresh)
         
-        return jsonify({
-            'success': True,
-            'data': sections,
-            'financial_charts': financial_data,
-            'raw_results': results
-        })
+        return jsonify({**payload, 'cached': False, 'stale': False})
         
     except Exception as e:
         print(f"[API] Error during analysis: {e}")
         return jsonify({'error': f'Analysis failed: {str(e)}'}), 500
 
+def parse_latency_budget(value):
+    """Return the requested latency budget in seconds, or None if it is invalid"""
+    if value is None:
+        return LATENCY_BUDGET
+    if isinstance(value, bool):
+        return None
+    try:
+        budget = float(value)
+    except (TypeError, ValueError):
+        return None
+    return budget if 0 < budget < float('inf') else None
+
+def run_analysis(company_name, company_url, sections=None, budget=None):
+    """Run the analysis for the given sections (None means all) and cache the result
+
+    Returns the response payload and the CoordinatorAgent that produced it.
+    budget is the latency budget in seconds; background refreshes run without one.
+    """
+    cached = analysis_cache.get(company_name, company_url)
+    # Sections that were fallback content last time have no good text to reuse
+    previous = {
+        section: text for section, text in cached['sections'].items()
+        if cached['degraded'].get(section) != "fallback"
+    } if cached else {}
+    deadline = Deadline(budget) if budget is not None else None
+    
+    # Financial charts only need refreshing along with the financial section
+    cached_charts = cached['financial_charts'] if cached else {}
+    good_cached_charts = bool(cached_charts) and 'error' not in cached_charts
+    refresh_charts = not (cached and sections is not None and 'financial' not in sections)
+    chart_future = None
+    if refresh_charts and deadline:
+        # Build the charts alongside the workflow so they share its budget
+        chart_future = STAGE_EXECUTOR.submit(generate_financial_chart_data, company_name)
+    
+    # Run the analysis using the existing coordinator agent
+    agent = CoordinatorAgent(company_name, company_url)
+    agent.run_workflow(sections=sections, previous=previous,
+                       budget=deadline.remaining() if deadline else None)
+    
+    if not refresh_charts:
+        financial_data = cached_charts
+    elif chart_future:
+        try:
+            financial_data = chart_future.result(timeout=deadline.remaining())
+        except FutureTimeout:
+            print(f"[Charts] Chart build for {company_name} exceeded the latency budget")
+            if not chart_future.cancel():
+                agent.running_stages['financial_charts'] = chart_future
+            financial_data = {
+                **build_chart_payload(None),
+                'error': f'Financial charts for {company_name} did not finish within the latency budget.'
+            }
+    else:
+        financial_data = generate_financial_chart_data(company_name)
+    
+    # A failed or late chart build never replaces good cached charts
+    if refresh_charts and 'error' in financial_data:
+        if good_cached_charts:
+            financial_data = cached_charts
+        agent.degraded['financial_charts'] = "cached" if good_cached_charts else "fallback"
+    
+    # Degraded sections keep their old timestamp so they stay stale
+    analysis_cache.put(company_name, company_url, agent.results, financial_data, agent.degraded,
+                       refreshed_sections=agent.refreshed_sections)
+    payload = build_payload(agent.results, financial_data, agent.degraded)
+    return payload, agent
+
+def build_payload(sections, financial_charts, degraded):
+    """Build the analysis response from section texts, chart data and degraded sections"""
+    results = build_report(sections)
+    return {
+        'success': True,
+        'data': parse_results(results),
+        'financial_charts': financial_charts,
+        'raw_results': results,
+        'degraded': degraded
+    }
+
 def parse_results(results):
     """Parse the results into structured sections"""
     sections = {}
@@ -136,111 +246,48 @@ def format_section_content(content):
     
     return '\n'.join(formatted_lines)
 
-def generate_financial_chart_data(company_name):
+def generate_financial_chart_data(company_name, period=CHART_PERIOD):
     """Generate financial chart data for visualization"""
     try:
         # Try to get financial data from Yahoo Finance
         ticker = yf.Ticker(company_name)
         
-        # Get basic info
-        info = ticker.info
-        
-        # Get historical data for the last year
-        hist = ticker.history(period="1y")
-        
-        # Get quarterly financials
-        quarterly = ticker.quarterly_financials
-        
-        # Prepare chart data
-        charts = {}
-        
-        # Stock price chart
-        if not hist.empty:
-            charts['stock_price'] = {
-                'labels': [date.strftime('%Y-%m-%d') for date in hist.index[-30:]],  # Last 30 days
-                'datasets': [{
-                    'label': 'Stock Price ($)',
-                    'data': hist['Close'].tail(30).tolist(),
-                    'borderColor': 'rgb(75, 192, 192)',
-                    'backgroundColor': 'rgba(75, 192, 192, 0.2)',
-                    'fill': True
-                }]
-            }
-        
-        # Volume chart
-        if not hist.empty:
-            charts['volume'] = {
-                'labels': [date.strftime('%Y-%m-%d') for date in hist.index[-30:]],
-                'datasets': [{
-                    'label': 'Trading Volume',
-                    'data': hist['Volume'].tail(30).tolist(),
-                    'borderColor': 'rgb(255, 99, 132)',
-                    'backgroundColor': 'rgba(255, 99, 132, 0.2)',
-                    'fill': True
-                }]
-            }
-        
-        # Financial metrics pie chart
-        if info:
-            financial_metrics = {}
-            if 'marketCap' in info and info['marketCap']:
-                financial_metrics['Market Cap'] = info['marketCap']
-            if 'totalRevenue' in info and info['totalRevenue']:
-                financial_metrics['Revenue'] = info['totalRevenue']
-            if 'totalDebt' in info and info['totalDebt']:
-                financial_metrics['Total Debt'] = info['totalDebt']
-            if 'totalCash' in info and info['totalCash']:
-                financial_metrics['Cash'] = info['totalCash']
-                
-            if financial_metrics:
-                charts['financial_breakdown'] = {
-                    'labels': list(financial_metrics.keys()),
-                    'datasets': [{
-                        'label': 'Financial Metrics',
-                        'data': list(financial_metrics.values()),
-                        'backgroundColor': [
-                            'rgba(54, 162, 235, 0.8)',
-                            'rgba(255, 206, 86, 0.8)',
-                            'rgba(255, 99, 132, 0.8)',
-                            'rgba(75, 192, 192, 0.8)',
-                            'rgba(153, 102, 255, 0.8)',
-                            'rgba(255, 159, 64, 0.8)'
-                        ]
-                    }]
-                }
-        
-        # Revenue trend (if quarterly data available)
-        if not quarterly.empty and 'Total Revenue' in quarterly.index:
-            revenue_data = quarterly.loc['Total Revenue'].dropna()
-            if len(revenue_data) > 0:
-                charts['revenue_trend'] = {
-                    'labels': [col.strftime('%Y-Q%q') for col in revenue_data.index],
-                    'datasets': [{
-                        'label': 'Quarterly Revenue',
-                        'data': revenue_data.tolist(),
-                        'borderColor': 'rgb(54, 162, 235)',
-                        'backgroundColor': 'rgba(54, 162, 235, 0.2)',
-                        'fill': True
-                    }]
-                }
-        
-        return charts
+        # Build a columnar payload from the price history, info and quarterly financials
+        return build_chart_payload(
+            ticker.history(period=period),
+            info=ticker.info,
+            quarterly=ticker.quarterly_financials
+        )
         
     except Exception as e:
         print(f"[Charts] Error generating financial charts: {e}")
+        # Same columnar format as a successful build, with no series
         return {
-            'error': f'Could not generate financial charts for {company_name}. Data may not be available.',
-            'demo_chart': {
-                'labels': ['Q1', 'Q2', 'Q3', 'Q4'],
-                'datasets': [{
-                    'label': 'Sample Revenue (Millions)',
-                    'data': [100, 120, 135, 150],
-                    'borderColor': 'rgb(75, 192, 192)',
-                    'backgroundColor': 'rgba(75, 192, 192, 0.2)',
-                    'fill': True
-                }]
-            }
+            **build_chart_payload(None),
+            'error': f'Could not generate financial charts for {company_name}. Data may not be available.'
         }
 
+prewarm_scheduler = PrewarmScheduler(
+    analysis_cache,
+    run_analysis,
+    watchlist=load_watchlist(os.environ.get("PRELYTICS_WATCHLIST")),
+    max_workers=int(os.environ.get("PRELYTICS_PREWARM_WORKERS", "2")),
+    poll_interval=int(os.environ.get("PRELYTICS_PREWARM_INTERVAL", "300")),
+    off_peak_hours=parse_hours(os.environ.get("PRELYTICS_OFF_PEAK_HOURS"))
+)
+# Keep the shared competitor profiles fresh alongside the watchlist
+prewarm_scheduler.add_periodic_task("Competitor index refresh", competitor_index.refresh_stale)
+
+def start_dev_scheduler():
+    """Start the scheduler in the debug server's serving process only.
+
+    The reloader runs __main__ in both its watcher and serving processes;
+    WERKZEUG_RUN_MAIN is only set in the serving one. Under gunicorn, run
+    scheduler.py as its own process instead.
+    """
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        prewarm_scheduler.start()
+
 if __name__ == '__main__':
+    start_dev_scheduler()
     app.run(debug=True, host='0.0.0.0', port=5000)
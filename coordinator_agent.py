@@ -3,92 +3,208 @@ from agents import financial_insight
 from agents import operational_signal
 from agents import competitor_analysis
 from agents import product_analysis
-from utils.error_handler import generate_fallback_content
+from utils.error_handler import generate_fallback_content, is_ai_failure
+from utils.deadline import Deadline, deadline_scope
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as StageTimeout
+import contextvars
 import logging
+import os
+
+# Report sections in the order they appear in the final report
+SECTION_HEADERS = [
+    ('client', "==== CLIENT INTELLIGENCE REPORT ===="),
+    ('leadership', "==== KEY DECISION MAKERS ===="),
+    ('financial', "==== FINANCIAL INSIGHTS ===="),
+    ('operational', "==== OPERATIONAL SIGNALS ===="),
+    ('competitor', "==== COMPETITOR ANALYSIS ===="),
+    ('product', "==== PRODUCT ANALYSIS ===="),
+]
+
+# Order in which the analysis stages are executed
+SECTION_ORDER = ['client', 'financial', 'operational', 'competitor', 'leadership', 'product']
+
+# Relative share of the latency budget given to each stage
+STAGE_WEIGHTS = {
+    'client': 3,
+    'financial': 3,
+    'operational': 2,
+    'competitor': 1,
+    'leadership': 2,
+    'product': 2,
+}
+
+# Stages with less time than this left go straight to their degraded path
+MIN_STAGE_SECONDS = 0.5
+
+# Worker pool shared by every budgeted workflow
+STAGE_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("PRELYTICS_STAGE_WORKERS", "8")),
+    thread_name_prefix="stage"
+)
+
+def build_report(results):
+    """Combine a dict of section name -> text into the final report"""
+    report = []
+    for section, header in SECTION_HEADERS:
+        report.append(header if not report else "\n" + header)
+        report.append(results.get(section) or f"[No {section} data available]")
+    return "\n".join(report)
 
 class CoordinatorAgent:
     def __init__(self, name, url):
         print(f"[DEBUG] CoordinatorAgent initialized with {name}, {url}")
         self.name = name
         self.url = url
-
-    def run_workflow(self):
-        print(f"\n[CoordinatorAgent] Starting intelligence generation for: {self.name}")
-
-        # Initialize results with fallbacks
-        results = {}
-        
-        # 1. Client Intelligence
+        self.results = {}
+        self.refreshed_sections = []
+        self.degraded = {}
+        self.running_stages = {}
+
+    # Each stage returns None when it fails, comes back empty or returns the
+    # nlp_tools failure placeholder, so the coordinator can keep the previous
+    # text instead of caching error or fallback content
+
+    def _usable(self, section, result):
+        if result and is_ai_failure(result):
+            print(f"[CoordinatorAgent] {section} stage returned AI failure text")
+            return None
+        return result or None
+
+    def _client_intelligence(self):
         try:
-            client_data = client_intelligence.extract_profile(self.name, self.url)
-            results['client'] = client_data if client_data else generate_fallback_content(self.name, "client")
+            return self._usable('client', client_intelligence.extract_profile(self.name, self.url))
         except Exception as e:
             print(f"[CoordinatorAgent] Client intelligence failed: {e}")
-            results['client'] = generate_fallback_content(self.name, "client")
+            return None
 
-        # 2. Financial Insight (Tabular + SWOT + CAGR)
+    def _financial_insight(self):
+        # Tabular + SWOT + CAGR
         try:
-            financial_data = financial_insight.analyze_financials(self.name)
-            results['financial'] = financial_data if financial_data else generate_fallback_content(self.name, "financial")
+            return self._usable('financial', financial_insight.analyze_financials(self.name))
         except Exception as e:
             print(f"[CoordinatorAgent] Financial analysis failed: {e}")
-            results['financial'] = generate_fallback_content(self.name, "financial")
+            return None
 
-        # 3. Operational Signals
+    def _operational_signals(self):
         try:
-            ops_data = operational_signal.extract_operational_signals(self.name, self.url)
-            results['operational'] = ops_data if ops_data else generate_fallback_content(self.name, "operational")
+            return self._usable('operational', operational_signal.extract_operational_signals(self.name, self.url))
         except Exception as e:
             print(f"[CoordinatorAgent] Operational analysis failed: {e}")
-            results['operational'] = generate_fallback_content(self.name, "operational")
+            return None
 
-        # 4. Competitor Analysis
+    def _competitor_analysis(self):
         try:
-            competitor_report = competitor_analysis.extract_competitor_analysis(self.name)
-            results['competitor'] = competitor_report if competitor_report else generate_fallback_content(self.name, "competitor")
+            return self._usable('competitor', competitor_analysis.extract_competitor_analysis(self.name))
         except Exception as e:
             print(f"[CoordinatorAgent] Competitor analysis failed: {e}")
-            results['competitor'] = generate_fallback_content(self.name, "competitor")
+            return None
 
-        # 5. Key Decision Makers
+    def _decision_makers(self):
         try:
-            leadership = client_intelligence.extract_leadership_names(self.url)
-            results['leadership'] = leadership if leadership else f"Leadership analysis for {self.name} requires additional processing time."
+            return self._usable('leadership', client_intelligence.extract_leadership_names(self.url))
         except Exception as e:
             print(f"[CoordinatorAgent] Leadership extraction failed: {e}")
-            results['leadership'] = f"Leadership information for {self.name} will be available shortly."
+            return None
 
-        # 6. Product Analysis
+    def _product_analysis(self):
         try:
-            product_report = product_analysis.analyze_client(self.name, self.url)
-            results['product'] = product_report if product_report else generate_fallback_content(self.name, "product")
+            return self._usable('product', product_analysis.analyze_client(self.name, self.url))
         except Exception as e:
             print(f"[CoordinatorAgent] Product analysis failed: {e}")
-            results['product'] = generate_fallback_content(self.name, "product")
-
-        # 6. Final Report Sections
-        report = []
-        report.append("==== CLIENT INTELLIGENCE REPORT ====")
-        report.append(client_data or "[No client intelligence available]")
-
-        # Decision Makers Summary
-        report.append("\n==== KEY DECISION MAKERS ====")
-        report.append(leadership or "[No leadership data available]")
-
-        report.append("\n==== FINANCIAL INSIGHTS ====")
-        report.append(financial_data or "[No financial data found]")
-
-        report.append("\n==== OPERATIONAL SIGNALS ====")
-        report.append(ops_data or "[No operational signals found]")
-
-        report.append("\n==== COMPETITOR ANALYSIS ====")
-        report.append(competitor_report or "[No competitor report found]")
-
-        report.append("\n==== PRODUCT ANALYSIS ====")
-        report.append(product_report or "[No product analysis found]")
+            return None
+
+    def _degraded_result(self, section, previous):
+        """Cheap stand-in for a stage that failed or ran out of time"""
+        if previous.get(section):
+            self.degraded[section] = "cached"
+            return previous[section]
+        self.degraded[section] = "fallback"
+        if section == 'leadership':
+            return f"Leadership information for {self.name} will be available shortly."
+        return generate_fallback_content(self.name, section)
+
+    def _run_stage(self, stage, section, stage_budget):
+        """Run a stage under its own deadline; returns None if it overruns"""
+        stage_deadline = Deadline(stage_budget)
+
+        def run():
+            with deadline_scope(stage_deadline):
+                return stage()
+
+        # The context copy carries the deadline into the worker thread
+        future = STAGE_EXECUTOR.submit(contextvars.copy_context().run, run)
+        try:
+            return future.result(timeout=stage_budget)
+        except StageTimeout:
+            print(f"[CoordinatorAgent] {section} stage exceeded its {stage_budget:.1f}s budget")
+            # A started worker cannot be interrupted; its scrape and Gemini
+            # timeouts are capped by the stage deadline, so it stops shortly
+            if not future.cancel():
+                self.running_stages[section] = future
+            return None
+
+    def run_workflow(self, sections=None, previous=None, budget=None):
+        """Run the analysis stages and combine them into the final report.
+
+        sections limits which stages are re-run (all of them by default);
+        every other section is taken from previous, a dict of section
+        name -> text from an earlier run.
+
+        budget is the overall latency budget in seconds. It is spread over
+        the stages by STAGE_WEIGHTS. A stage that fails or runs out of time
+        is replaced by its previous text or fallback content and recorded in
+        self.degraded; only the other stages are listed in
+        self.refreshed_sections.
+        """
+        print(f"\n[CoordinatorAgent] Starting intelligence generation for: {self.name}")
 
-        # 7. Combine and display report
-        final_report = "\n".join(report)
+        stages = {
+            'client': self._client_intelligence,
+            'financial': self._financial_insight,
+            'operational': self._operational_signals,
+            'competitor': self._competitor_analysis,
+            'leadership': self._decision_makers,
+            'product': self._product_analysis,
+        }
+        previous = previous or {}
+        deadline = Deadline(budget) if budget is not None else None
+
+        self.results = {}
+        self.refreshed_sections = []
+        self.degraded = {}
+        self.running_stages = {}
+        pending = [
+            section for section in SECTION_ORDER
+            if sections is None or section in sections or not previous.get(section)
+        ]
+        for section in SECTION_ORDER:
+            if section not in pending:
+                print(f"[CoordinatorAgent] Reusing previous {section} section")
+                self.results[section] = previous[section]
+                continue
+
+            if not deadline:
+                result = stages[section]()
+            else:
+                # Give this stage its share of what is left of the budget
+                remaining_weight = sum(STAGE_WEIGHTS[name] for name in pending)
+                stage_budget = deadline.remaining() * STAGE_WEIGHTS[section] / remaining_weight
+                pending.remove(section)
+                result = None
+                if stage_budget >= MIN_STAGE_SECONDS:
+                    result = self._run_stage(stages[section], section, stage_budget)
+
+            if result is None:
+                self.results[section] = self._degraded_result(section, previous)
+            else:
+                self.results[section] = result
+                self.refreshed_sections.append(section)
+
+        if self.degraded:
+            print(f"[CoordinatorAgent] Degraded sections: {self.degraded}")
+
+        # Combine and display report
+        final_report = build_report(self.results)
 
         print("\n" + "=" * 80)
         print("               PRELYTICS BUSINESS INTELLIGENCE REPORT")
@@ -1,4 +1,5 @@
-from app import app
+from app import app, start_dev_scheduler
 
 if __name__ == "__main__":
+    start_dev_scheduler()
     app.run(debug=True, host='0.0.0.0', port=5000)
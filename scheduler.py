@@ -0,0 +1,6 @@
+from app import prewarm_scheduler
+
+# Run the watchlist and competitor index refreshes as a single dedicated
+# process alongside the gunicorn workers
+if __name__ == "__main__":
+    prewarm_scheduler.run_forever()
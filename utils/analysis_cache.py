@@ -0,0 +1,150 @@
+"""
+Analysis result cache for Prelytics platform
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from utils.error_handler import logger
+from utils.json_store import JsonFileStore
+
+CACHE_DIR = os.environ.get("PRELYTICS_CACHE_DIR", "outputs/cache/analyses")
+
+# How long (in seconds) each report section stays fresh before it is refreshed
+DEFAULT_REFRESH_INTERVALS = {
+    'client': 7 * 24 * 3600,
+    'leadership': 7 * 24 * 3600,
+    'financial': 24 * 3600,
+    'operational': 3 * 24 * 3600,
+    'competitor': 7 * 24 * 3600,
+    'product': 7 * 24 * 3600,
+}
+
+def parse_refresh_intervals(value):
+    """Parse a JSON object of section name -> seconds; {} if unset or invalid"""
+    if not value:
+        return {}
+    try:
+        intervals = json.loads(value)
+    except ValueError as e:
+        logger.error(f"[Cache] Ignoring invalid refresh intervals {value!r}: {e}")
+        return {}
+    if not isinstance(intervals, dict):
+        logger.error(f"[Cache] Ignoring refresh intervals {value!r}: expected a JSON object")
+        return {}
+    return intervals
+
+def cache_key(company_name):
+    """Normalize a company name into a cache key"""
+    return " ".join(company_name.lower().split())
+
+def normalize_url(url):
+    """Reduce a company URL to its host and path for comparison"""
+    url = re.sub(r"^[a-z]+://", "", url.strip().lower())
+    if url.startswith("www."):
+        url = url[len("www."):]
+    return url.rstrip("/")
+
+def _is_newer(entry, other):
+    return entry['updated_at'] >= other['updated_at']
+
+class AnalysisCache:
+    """Thread-safe store of the last good analysis per company.
+
+    Each company is persisted to its own small JSON file, shared by every
+    worker process, so a lookup only reads that company's file and only
+    when another process has rewritten it.
+    """
+
+    def __init__(self, directory=CACHE_DIR, refresh_intervals=None):
+        self.directory = directory
+        self.refresh_intervals = dict(DEFAULT_REFRESH_INTERVALS)
+        for section, interval in (refresh_intervals or {}).items():
+            # Unknown sections would never get a timestamp and always look stale
+            if section not in DEFAULT_REFRESH_INTERVALS:
+                logger.warning(f"[Cache] Ignoring refresh interval for unknown section {section!r}")
+            elif isinstance(interval, bool) or not isinstance(interval, (int, float)) or interval <= 0:
+                logger.warning(f"[Cache] Ignoring invalid refresh interval {interval!r} for {section}")
+            else:
+                self.refresh_intervals[section] = interval
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._stores = {}
+
+    def _store(self, key):
+        """Return the JSON store for one company (call with self._lock held)"""
+        if key not in self._stores:
+            slug = re.sub(r"[^a-z0-9]+", "-", key).strip("-")[:40]
+            digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:10]
+            path = os.path.join(self.directory, f"{slug}-{digest}.json") if self.directory else None
+            self._stores[key] = JsonFileStore(path, "Cache")
+        return self._stores[key]
+
+    def _sync(self, key):
+        """Pick up an entry written by another process (call with self._lock held)"""
+        entry = (self._store(key).load_if_changed() or {}).get(key)
+        if entry and (key not in self._entries or _is_newer(entry, self._entries[key])):
+            self._entries[key] = entry
+
+    def get(self, company_name, company_url=None):
+        """Return the cached entry for a company, or None.
+
+        An entry cached for a different company_url counts as a miss.
+        """
+        key = cache_key(company_name)
+        with self._lock:
+            self._sync(key)
+            entry = self._entries.get(key)
+        if not entry:
+            return None
+        if company_url and normalize_url(entry['company_url']) != normalize_url(company_url):
+            return None
+        return dict(entry)
+
+    def put(self, company_name, company_url, sections, financial_charts, degraded, refreshed_sections=None):
+        """Store an analysis.
+
+        sections is the dict of section name -> report text and degraded the
+        coordinator's map of degraded sections; only the sections listed in
+        refreshed_sections (all of them by default) get their refresh
+        timestamp bumped.
+        """
+        now = time.time()
+        key = cache_key(company_name)
+        if refreshed_sections is None:
+            refreshed_sections = list(sections)
+        with self._lock:
+            self._sync(key)
+            previous = self._entries.get(key, {})
+            if previous and normalize_url(previous['company_url']) != normalize_url(company_url):
+                # Replacing another site's analysis: none of its timestamps apply
+                previous = {}
+            refreshed_at = dict(previous.get('refreshed_at', {}))
+            for section in refreshed_sections:
+                refreshed_at[section] = now
+            entry = {
+                'company_name': company_name,
+                'company_url': company_url,
+                'sections': sections,
+                'financial_charts': financial_charts,
+                'degraded': degraded,
+                'refreshed_at': refreshed_at,
+                'updated_at': now,
+            }
+            merged = self._store(key).merge_save({key: entry}, _is_newer)
+            self._entries[key] = (merged or {}).get(key, entry)
+
+    def stale_sections(self, company_name, company_url=None, now=None):
+        """List the sections of a cached company that are past their refresh interval"""
+        entry = self.get(company_name, company_url)
+        if not entry:
+            return list(self.refresh_intervals)
+        now = now or time.time()
+        refreshed_at = entry.get('refreshed_at', {})
+        return [
+            section for section, interval in self.refresh_intervals.items()
+            if now - refreshed_at.get(section, 0) >= interval
+        ]
@@ -0,0 +1,174 @@
+"""
+Columnar chart payloads for Prelytics platform
+"""
+import numpy as np
+import pandas as pd
+
+SECONDS_PER_DAY = 86400
+
+# Default cap on plotted points per series; longer ranges are downsampled with LTTB
+DEFAULT_MAX_POINTS = 365
+
+# Chart styling sent once per payload instead of once per dataset
+SERIES_STYLES = {
+    'close': {'label': 'Stock Price ($)', 'borderColor': 'rgb(75, 192, 192)', 'backgroundColor': 'rgba(75, 192, 192, 0.2)'},
+    'volume': {'label': 'Trading Volume', 'borderColor': 'rgb(255, 99, 132)', 'backgroundColor': 'rgba(255, 99, 132, 0.2)'},
+    'revenue': {'label': 'Quarterly Revenue', 'borderColor': 'rgb(54, 162, 235)', 'backgroundColor': 'rgba(54, 162, 235, 0.2)'},
+    'financial_breakdown': {
+        'label': 'Financial Metrics',
+        'backgroundColor': [
+            'rgba(54, 162, 235, 0.8)',
+            'rgba(255, 206, 86, 0.8)',
+            'rgba(255, 99, 132, 0.8)',
+            'rgba(75, 192, 192, 0.8)',
+            'rgba(153, 102, 255, 0.8)',
+            'rgba(255, 159, 64, 0.8)'
+        ]
+    },
+}
+
+BREAKDOWN_METRICS = [
+    ('marketCap', 'Market Cap'),
+    ('totalRevenue', 'Revenue'),
+    ('totalDebt', 'Total Debt'),
+    ('totalCash', 'Cash'),
+]
+
+def date_axis(index):
+    """Encode a DatetimeIndex as an epoch start (seconds) plus whole-day offsets"""
+    seconds = pd.DatetimeIndex(index).as_unit('s').asi8
+    if len(seconds) == 0:
+        return {'start': None, 'unit': 'day', 'offsets': []}
+    # Rounding absorbs DST shifts in exchange-local timestamps
+    offsets = np.rint((seconds - seconds[0]) / SECONDS_PER_DAY).astype(np.int64)
+    return {'start': int(seconds[0]), 'unit': 'day', 'offsets': offsets.tolist()}
+
+def lttb_indices(x, y, threshold):
+    """Row indices picked by Largest-Triangle-Three-Buckets downsampling"""
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # Interior points are split into threshold - 2 buckets; first and last are always kept
+    edges = np.floor(np.arange(threshold - 1) * (n - 2) / (threshold - 2)).astype(np.int64) + 1
+    edges[-1] = n - 1
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[:-1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(y[:-1], edges[:-1]) / counts
+    # Each bucket is compared against the average of the next one (the last point for the final bucket)
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        area = np.abs(
+            (x[a] - next_x[i]) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (next_y[i] - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+def fill_missing_prices(hist):
+    """Fill gaps Yahoo leaves in some rows: no volume is 0, missing prices take the close"""
+    filled = {}
+    if 'Volume' in hist:
+        filled['Volume'] = hist['Volume'].fillna(0)
+    for column in ('Open', 'High', 'Low'):
+        if column in hist:
+            filled[column] = hist[column].fillna(hist['Close'])
+    return hist.assign(**filled)
+
+def price_aggregates(hist):
+    """Range-level OHLC and volume figures computed over every row"""
+    close = hist['Close'].to_numpy()
+    first_close = close[0]
+    ohlc = {
+        'open': round(float(hist['Open'].iat[0] if 'Open' in hist else first_close), 4),
+        'high': round(float(hist['High'].max() if 'High' in hist else close.max()), 4),
+        'low': round(float(hist['Low'].min() if 'Low' in hist else close.min()), 4),
+        'close': round(float(close[-1]), 4),
+        'change_pct': round(float((close[-1] - first_close) / first_close * 100), 2) if first_close else None,
+    }
+    aggregates = {'ohlc': ohlc, 'points': len(hist)}
+    if 'Volume' in hist:
+        volume = hist['Volume'].to_numpy()
+        aggregates['volume'] = {
+            'total': int(volume.sum()),
+            'mean': int(volume.mean()),
+            'max': int(volume.max()),
+        }
+    return aggregates
+
+def monthly_ohlc(hist):
+    """Monthly OHLC/volume bars as columns on their own date axis"""
+    agg = {'Close': 'last'}
+    for column, how in (('Open', 'first'), ('High', 'max'), ('Low', 'min'), ('Volume', 'sum')):
+        if column in hist:
+            agg[column] = how
+    monthly = hist.resample('MS').agg(agg).dropna(subset=['Close'])
+    columns = {column.lower(): monthly[column].round(4).tolist() for column in agg if column != 'Volume'}
+    if 'Volume' in monthly:
+        columns['volume'] = monthly['Volume'].astype(np.int64).tolist()
+    return {'axis': date_axis(monthly.index), **columns}
+
+def build_chart_payload(hist, info=None, quarterly=None, max_points=DEFAULT_MAX_POINTS):
+    """Build a compact columnar chart payload.
+
+    Price and volume share one date axis, encoded as an epoch start plus
+    day offsets. Series longer than max_points are downsampled with LTTB on
+    the close price, while the aggregates are computed over the full range.
+    The payload carries an 'error' message whenever no price series is built.
+    """
+    charts = {'styles': SERIES_STYLES}
+
+    if hist is not None and not hist.empty and 'Close' in hist:
+        hist = fill_missing_prices(hist.dropna(subset=['Close']))
+    if hist is not None and not hist.empty and 'Close' in hist:
+        axis = date_axis(hist.index)
+        offsets = np.asarray(axis['offsets'])
+        rows = lttb_indices(offsets, hist['Close'].to_numpy(), max_points) if max_points else np.arange(len(hist))
+        axis['offsets'] = offsets[rows].tolist()
+
+        series = {'close': hist['Close'].to_numpy()[rows].round(4).tolist()}
+        if 'Volume' in hist:
+            series['volume'] = hist['Volume'].to_numpy()[rows].astype(np.int64).tolist()
+
+        charts['price'] = {'axis': axis, 'series': series, 'downsampled': len(rows) < len(hist)}
+        charts['aggregates'] = price_aggregates(hist)
+        charts['monthly'] = monthly_ohlc(hist)
+
+    # Financial metrics breakdown
+    if info:
+        metrics = [(label, info[key]) for key, label in BREAKDOWN_METRICS if info.get(key)]
+        if metrics:
+            charts['financial_breakdown'] = {
+                'labels': [label for label, _ in metrics],
+                'values': [value for _, value in metrics],
+            }
+
+    # Revenue trend (if quarterly data available)
+    if quarterly is not None and not quarterly.empty and 'Total Revenue' in quarterly.index:
+        revenue = quarterly.loc['Total Revenue'].dropna()
+        if len(revenue) > 0:
+            revenue.index = pd.DatetimeIndex(revenue.index)
+            revenue = revenue.sort_index()
+            quarters = revenue.index
+            charts['revenue_trend'] = {
+                'axis': date_axis(quarters),
+                'labels': (quarters.year.astype(str) + '-Q' + quarters.quarter.astype(str)).tolist(),
+                'values': revenue.astype(float).tolist(),
+            }
+
+    # yfinance returns an empty history rather than raising for unknown or throttled tickers
+    if 'price' not in charts:
+        charts['error'] = 'No price history available.'
+
+    return charts
@@ -0,0 +1,208 @@
+"""
+Shared competitor-landscape knowledge base for Prelytics platform
+"""
+import os
+import re
+import threading
+import time
+
+import yfinance as yf
+
+from utils.deadline import time_remaining
+from utils.error_handler import logger
+from utils.json_store import JsonFileStore
+
+INDEX_PATH = os.environ.get("PRELYTICS_COMPETITOR_INDEX_PATH", "outputs/cache/competitor_index.json")
+
+# How long (in seconds) a segment's competitor profiles stay fresh
+INDEX_TTL = int(os.environ.get("PRELYTICS_COMPETITOR_INDEX_TTL", str(7 * 24 * 3600)))
+
+# Firms Agilisium typically competes against
+COMPETITOR_FIRMS = ["McKinsey", "Bain", "BCG", "Deloitte", "Accenture", "IQVIA"]
+
+# Industry segments and the name keywords used to place a client in one when
+# Yahoo Finance has no sector for it. Keywords match whole words; those of five
+# or more letters also match as word prefixes ("pharma" -> "pharmaceuticals").
+INDUSTRY_SEGMENTS = {
+    'life_sciences': ["pharma", "therapeutics", "biotech", "biologics", "biosciences", "genomics", "clinical",
+                      "medical", "vaccines", "drug", "pfizer", "novartis", "merck", "roche", "sanofi", "amgen",
+                      "gilead", "abbvie", "lilly", "astrazeneca", "moderna", "novo", "nordisk", "medtronic",
+                      "regeneron", "abbott", "bayer", "biogen", "takeda", "gsk", "iqvia"],
+    'healthcare': ["health", "hospital", "hospitals", "care", "clinic", "clinics", "insurance"],
+    'financial_services': ["bank", "banks", "bancorp", "capital", "financial", "invest", "asset", "credit",
+                           "payments"],
+    'technology': ["technolog", "software", "data", "cloud", "digital", "systems", "microsoft"],
+    'retail': ["retail", "stores", "shop", "mart", "consumer", "brands"],
+    'manufacturing': ["manufactur", "industr", "motors", "automotive", "steel", "chemical", "energy"],
+    'general': [],
+}
+
+# Yahoo Finance industries that belong to life sciences rather than healthcare services
+LIFE_SCIENCES_INDUSTRIES = ["drug manufacturers", "biotechnology", "medical devices", "medical instruments",
+                            "diagnostics", "pharmaceutical"]
+
+# Yahoo Finance sectors and the segment they map to
+SECTOR_SEGMENTS = {
+    'healthcare': 'healthcare',
+    'financial services': 'financial_services',
+    'technology': 'technology',
+    'communication services': 'technology',
+    'consumer cyclical': 'retail',
+    'consumer defensive': 'retail',
+    'industrials': 'manufacturing',
+    'basic materials': 'manufacturing',
+    'energy': 'manufacturing',
+}
+
+# Seconds a Yahoo Finance lookup needs; with less budget left only the name is used
+SECTOR_LOOKUP_MIN_SECONDS = 2
+
+_segment_cache = {}
+
+def segment_from_info(info):
+    """Map Yahoo Finance sector/industry info to a segment, or None if unknown"""
+    sector = (info.get('sector') or "").lower()
+    industry = (info.get('industry') or "").lower()
+    if any(name in industry for name in LIFE_SCIENCES_INDUSTRIES):
+        return 'life_sciences'
+    return SECTOR_SEGMENTS.get(sector)
+
+def classify_segment(client_name):
+    """Place a client in an industry segment from its name, defaulting to general"""
+    words = re.findall(r"[a-z]+", client_name.lower())
+    for segment, keywords in INDUSTRY_SEGMENTS.items():
+        for keyword in keywords:
+            if any(word == keyword or (len(keyword) >= 5 and word.startswith(keyword)) for word in words):
+                return segment
+    return 'general'
+
+def lookup_segment(client_name):
+    """Place a client in an industry segment.
+
+    client_name is usually a ticker, so Yahoo Finance sector/industry info
+    is tried first; the name keywords are the fallback.
+    """
+    key = client_name.strip().lower()
+    if key in _segment_cache:
+        return _segment_cache[key]
+
+    remaining = time_remaining()
+    if remaining is not None and remaining < SECTOR_LOOKUP_MIN_SECONDS:
+        return classify_segment(client_name)
+
+    segment = None
+    try:
+        segment = segment_from_info(yf.Ticker(client_name.strip()).info or {})
+    except Exception as e:
+        logger.warning(f"[CompetitorIndex] Sector lookup failed for {client_name}: {e}")
+    segment = segment or classify_segment(client_name)
+    _segment_cache[key] = segment
+    return segment
+
+def _is_newer(entry, other):
+    return entry['built_at'] >= other['built_at']
+
+class CompetitorIndex:
+    """Thread-safe store of competitor profiles per industry segment.
+
+    build_func(segment) must return a list of profile dicts with name,
+    services, strengths, weaknesses and differentiation keys, most relevant
+    competitor first. Profiles are persisted to a JSON file shared by every
+    worker process.
+    """
+
+    def __init__(self, build_func, path=INDEX_PATH, ttl=INDEX_TTL):
+        self.build_func = build_func
+        self.ttl = ttl
+        self._store = JsonFileStore(path, "CompetitorIndex")
+        self._lock = threading.Lock()
+        self._segment_locks = {}
+        self._segments = {}
+        self._sync()
+
+    def _sync(self):
+        """Pick up segments built by other processes (call with self._lock held)"""
+        segments = self._store.load_if_changed()
+        for segment, entry in (segments or {}).items():
+            if segment not in self._segments or _is_newer(entry, self._segments[segment]):
+                self._segments[segment] = entry
+
+    def _entry(self, segment):
+        with self._lock:
+            self._sync()
+            return self._segments.get(segment)
+
+    def _segment_lock(self, segment):
+        with self._lock:
+            return self._segment_locks.setdefault(segment, threading.Lock())
+
+    def is_stale(self, segment, now=None):
+        entry = self._entry(segment)
+        return not entry or (now or time.time()) - entry['built_at'] >= self.ttl
+
+    def _build(self, segment):
+        """Run build_func and store the result (call with the segment's lock held)"""
+        logger.info(f"[CompetitorIndex] Building competitor profiles for {segment}")
+        profiles = self.build_func(segment)
+        if not profiles:
+            logger.warning(f"[CompetitorIndex] No profiles built for {segment}")
+            return False
+        entry = {'profiles': profiles, 'built_at': time.time()}
+        with self._lock:
+            self._segments[segment] = entry
+            merged = self._store.merge_save({segment: entry}, _is_newer)
+            if merged:
+                self._segments = merged
+        return True
+
+    def refresh(self, segment):
+        """Rebuild the profiles for one segment; keeps the old ones if the build fails"""
+        with self._segment_lock(segment):
+            return self._build(segment)
+
+    def _queue_build(self, segment):
+        """Build a missing segment on a background thread unless one is already building it"""
+        lock = self._segment_lock(segment)
+        if not lock.acquire(blocking=False):
+            return
+
+        def build():
+            try:
+                self._build(segment)
+            except Exception as e:
+                logger.error(f"[CompetitorIndex] Background build for {segment} failed: {e}")
+            finally:
+                lock.release()
+
+        logger.info(f"[CompetitorIndex] Queued background build for {segment}")
+        threading.Thread(target=build, name=f"competitor-index-{segment}", daemon=True).start()
+
+    def get_profiles(self, segment):
+        """Return the profiles for a segment, building them if missing.
+
+        Under a latency budget a missing segment is built in the background
+        and no profiles are returned, so the build never runs on the request
+        path. Without a budget it is built inline.
+        """
+        entry = self._entry(segment)
+        if not entry:
+            if time_remaining() is not None:
+                self._queue_build(segment)
+                return []
+            with self._segment_lock(segment):
+                # Another thread may have built it while we waited
+                if not self._entry(segment):
+                    self._build(segment)
+            entry = self._entry(segment)
+        return entry['profiles'] if entry else []
+
+    def refresh_stale(self):
+        """Build every missing segment and rebuild every one past its TTL"""
+        with self._lock:
+            self._sync()
+            segments = list(dict.fromkeys(list(INDUSTRY_SEGMENTS) + list(self._segments)))
+        refreshed = 0
+        for segment in segments:
+            if self.is_stale(segment) and self.refresh(segment):
+                refreshed += 1
+        return refreshed
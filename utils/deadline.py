@@ -0,0 +1,43 @@
+"""
+Latency budget utilities for Prelytics platform
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+
+_current_deadline = contextvars.ContextVar("prelytics_deadline", default=None)
+
+class DeadlineExceeded(Exception):
+    """Raised when work fails because its latency budget ran out"""
+
+class Deadline:
+    """A point in time by which a piece of work should be finished"""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self):
+        """Seconds left before the deadline (never negative)"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+def current_deadline():
+    """Return the deadline of the current stage, or None when there is no budget"""
+    return _current_deadline.get()
+
+def time_remaining(default=None):
+    """Seconds left on the current deadline, or default when there is no budget"""
+    deadline = current_deadline()
+    return default if deadline is None else deadline.remaining()
+
+@contextmanager
+def deadline_scope(deadline):
+    """Make deadline the current deadline for the enclosed block"""
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
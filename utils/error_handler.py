@@ -9,6 +9,16 @@ from functools import wraps
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# Placeholder text nlp_tools returns instead of raising when a Gemini call fails
+AI_ERROR_PREFIX = "Error during AI processing:"
+AI_UNAVAILABLE_NOTE = "AI analysis temporarily unavailable"
+AI_NO_RESPONSE = "No response received"
+AI_FAILURE_MARKERS = (AI_ERROR_PREFIX, AI_UNAVAILABLE_NOTE, AI_NO_RESPONSE)
+
+def is_ai_failure(text):
+    """Whether text is, or contains, the placeholder returned for a failed AI call"""
+    return any(marker in text for marker in AI_FAILURE_MARKERS)
+
 def retry_with_backoff(max_retries=3, backoff_factor=2):
     """Decorator to retry functions with exponential backoff"""
     def decorator(func):
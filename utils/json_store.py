@@ -0,0 +1,81 @@
+"""
+Shared JSON file storage for Prelytics platform
+"""
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+
+from utils.error_handler import logger
+
+class JsonFileStore:
+    """A JSON object on disk shared by several processes.
+
+    Saves re-read the file under an exclusive lock and merge in only the
+    changed entries, so workers don't drop each other's updates.
+    """
+
+    def __init__(self, path, label):
+        self.path = path
+        self.label = label
+        self._mtime = None
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path + ".lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self):
+        with open(self.path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def load_if_changed(self):
+        """Return the file's entries if it changed since the last load or save, else None"""
+        if not self.path:
+            return None
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self._mtime:
+                return None
+            data = self._read()
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"[{self.label}] Could not load {self.path}: {e}")
+            return None
+        self._mtime = mtime
+        return data
+
+    def merge_save(self, entries, is_newer):
+        """Merge entries into the file and return the merged contents.
+
+        An entry replaces the one on disk only if is_newer(entry, on_disk) is true.
+        """
+        if not self.path:
+            return dict(entries)
+        try:
+            with self._locked():
+                try:
+                    merged = self._read()
+                except FileNotFoundError:
+                    merged = {}
+                except ValueError as e:
+                    logger.warning(f"[{self.label}] Replacing unreadable {self.path}: {e}")
+                    merged = {}
+                for key, entry in entries.items():
+                    if key not in merged or is_newer(entry, merged[key]):
+                        merged[key] = entry
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(merged, f)
+                os.replace(tmp_path, self.path)
+                self._mtime = os.stat(self.path).st_mtime_ns
+            return merged
+        except OSError as e:
+            logger.warning(f"[{self.label}] Could not save {self.path}: {e}")
+            return None
@@ -1,11 +1,41 @@
 import os
+import json
 from google import genai
 from google.genai import types
+from utils.deadline import DeadlineExceeded, time_remaining
+from utils.error_handler import AI_ERROR_PREFIX, AI_UNAVAILABLE_NOTE, AI_NO_RESPONSE
+from utils.competitor_index import CompetitorIndex, COMPETITOR_FIRMS, lookup_segment
+
+# Shortest Gemini request timeout; a failure with less time left is treated as a timeout
+MIN_REQUEST_SECONDS = 1
+
+def raise_if_out_of_time(error):
+    """Re-raise a failed Gemini call as DeadlineExceeded once the stage budget is spent.
+
+    get_model() caps the request timeout at the time left, so a call that
+    times out fails with no budget remaining. Raising lets the coordinator
+    record the section as degraded instead of caching the error text.
+    """
+    remaining = time_remaining()
+    if remaining is not None and remaining < MIN_REQUEST_SECONDS:
+        raise DeadlineExceeded(f"Latency budget spent: {error}") from error
+
+# Seconds a differentiation call needs; with less budget left the shared profiles are used as-is
+DIFFERENTIATION_MIN_SECONDS = 3
 
 def get_model():
-    """Get the Gemini client for text generation"""
-    client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-    return client
+    """Get the Gemini client for text generation
+
+    Under a latency budget the client's request timeout is capped at the time
+    left, so a stage that overruns stops instead of finishing in the background.
+    """
+    remaining = time_remaining()
+    if remaining is None:
+        return genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+    return genai.Client(
+        api_key=os.getenv("GEMINI_API_KEY"),
+        http_options=types.HttpOptions(timeout=max(MIN_REQUEST_SECONDS * 1000, int(remaining * 1000)))
+    )
 
 def summarize_company_info(company_name, raw_text):
     """Summarize company information using Gemini with fallback"""
@@ -28,7 +58,7 @@ def summarize_company_info(company_name, raw_text):
     # Try multiple times with fallback
     for attempt in range(3):
         try:
-            client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+            client = get_model()
             response = client.models.generate_content(
                 model="gemini-2.5-flash", 
                 contents=prompt,
@@ -40,7 +70,12 @@ def summarize_company_info(company_name, raw_text):
             if response.text and response.text.strip():
                 return response.text.strip()
         except Exception as e:
+            raise_if_out_of_time(e)
             print(f"[NLP] Attempt {attempt + 1} failed: {e}")
+            remaining = time_remaining()
+            if remaining is not None and remaining <= 2:
+                print("[NLP] Latency budget spent, using basic analysis")
+                break
             if attempt < 2:
                 import time
                 time.sleep(2)  # Wait before retry
@@ -54,7 +89,7 @@ def summarize_company_info(company_name, raw_text):
     • Strategic priorities: Requires further investigation
     • Decision makers: CEO, CTO, VP of Operations (estimated based on company size)
     
-    Note: AI analysis temporarily unavailable. Please try again or contact support.
+    Note: {AI_UNAVAILABLE_NOTE}. Please try again or contact support.
     """
 
 def summarize_financials(company_name, financial_json):
@@ -76,12 +111,13 @@ def summarize_financials(company_name, financial_json):
     
     print("[NLP] Sending financial data for analysis...")
     try:
-        client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+        client = get_model()
         response = client.models.generate_content(model="gemini-2.5-flash", contents=prompt)
-        return response.text if response.text else "No response received"
+        return response.text if response.text else AI_NO_RESPONSE
     except Exception as e:
+        raise_if_out_of_time(e)
         print(f"[NLP] Error during financial analysis: {e}")
-        return f"Error during AI processing: {str(e)}"
+        return f"{AI_ERROR_PREFIX} {str(e)}"
 
 def generate_swot_analysis(company_name, financial_data):
     """Generate SWOT analysis using Gemini"""
@@ -101,12 +137,13 @@ def generate_swot_analysis(company_name, financial_data):
     
     print("[NLP] Generating SWOT analysis...")
     try:
-        client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+        client = get_model()
         response = client.models.generate_content(model="gemini-2.5-flash", contents=prompt)
-        return response.text if response.text else "No response received"
+        return response.text if response.text else AI_NO_RESPONSE
     except Exception as e:
+        raise_if_out_of_time(e)
         print(f"[NLP] Error during SWOT analysis: {e}")
-        return f"Error during AI processing: {str(e)}"
+        return f"{AI_ERROR_PREFIX} {str(e)}"
 
 def compute_cagr(company_name, financial_data):
     """Compute CAGR using Gemini"""
@@ -120,10 +157,11 @@ def compute_cagr(company_name, financial_data):
     
     print("[NLP] Computing CAGR...")
     try:
-        client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+        client = get_model()
         response = client.models.generate_content(model="gemini-2.5-flash", contents=prompt)
         return response.text if response.text else "CAGR (Revenue): Not Available"
     except Exception as e:
+        raise_if_out_of_time(e)
         print(f"[NLP] Error during CAGR calculation: {e}")
         return "CAGR (Revenue): Not Available"
 
@@ -145,15 +183,134 @@ def summarize_operations(company_name, signals: dict):
     
     print("[NLP] Sending operational signals for summarization...")
     try:
-        client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+        client = get_model()
         response = client.models.generate_content(model="gemini-2.5-flash", contents=prompt)
-        return response.text if response.text else "No response received"
+        return response.text if response.text else AI_NO_RESPONSE
     except Exception as e:
+        raise_if_out_of_time(e)
         print(f"[NLP] Error during operations analysis: {e}")
-        return f"Error during AI processing: {str(e)}"
+        return f"{AI_ERROR_PREFIX} {str(e)}"
+
+def generate_competitor_profiles(segment):
+    """Build the shared competitor profiles for an industry segment using Gemini"""
+    segment_label = segment.replace('_', ' ')
+    prompt = f"""
+    You're working at Agilisium Consulting. Profile these competitors for clients in the {segment_label} industry:
+    {", ".join(COMPETITOR_FIRMS)}
+    
+    Return a JSON array ordered from most to least relevant competitor in this industry.
+    Each item must have these keys:
+    "name": firm name
+    "services": services the firm typically offers {segment_label} clients (one sentence)
+    "strengths": list of 2-3 short strengths
+    "weaknesses": list of 2-3 short weaknesses
+    "differentiation": how Agilisium can stand out against this firm (one sentence)
+    """
+    
+    print(f"[NLP] Building competitor profiles for {segment_label}...")
+    try:
+        client = get_model()
+        response = client.models.generate_content(
+            model="gemini-2.5-flash",
+            contents=prompt,
+            config=types.GenerateContentConfig(
+                temperature=0.3,
+                response_mime_type="application/json"
+            )
+        )
+        profiles = json.loads(response.text) if response.text else []
+        profiles = [profile for profile in profiles if isinstance(profile, dict) and profile.get('name')]
+        for profile in profiles:
+            for key in ('strengths', 'weaknesses'):
+                if isinstance(profile.get(key), str):
+                    profile[key] = [profile[key]]
+        return profiles
+    except Exception as e:
+        print(f"[NLP] Error building competitor profiles: {e}")
+        return []
+
+competitor_index = CompetitorIndex(build_func=generate_competitor_profiles)
+
+def differentiate_for_client(client_name, profiles):
+    """Short Gemini call tailoring the Agilisium differentiation to one client
+
+    Returns a dict of profile name -> strategy sentence.
+    """
+    names = [profile['name'] for profile in profiles]
+    competitor_lines = "\n".join(
+        f"{profile['name']}: weaknesses - {'; '.join(profile.get('weaknesses', []))}"
+        for profile in profiles
+    )
+    prompt = f"""
+    You're working at Agilisium Consulting and your client is {client_name}.
+    For each competitor below, write one sentence on how Agilisium can stand out with this client.
+    Return a JSON object whose keys are exactly these names: {json.dumps(names)}
+    and whose values are the sentences.
+    
+    {competitor_lines}
+    """
+    
+    print("[NLP] Tailoring competitor differentiation...")
+    try:
+        client = get_model()
+        response = client.models.generate_content(
+            model="gemini-2.5-flash",
+            contents=prompt,
+            config=types.GenerateContentConfig(
+                temperature=0.3,
+                max_output_tokens=400,
+                response_mime_type="application/json",
+                # Thinking tokens count against the output cap
+                thinking_config=types.ThinkingConfig(thinking_budget=0)
+            )
+        )
+        reply = json.loads(response.text) if response.text else {}
+    except Exception as e:
+        # Optional tailoring: the shared segment text is still a full answer
+        print(f"[NLP] Error during competitor differentiation: {e}")
+        return {}
+    if not isinstance(reply, dict):
+        return {}
+    
+    # Tolerate differences in case or spacing in the returned keys
+    by_name = {name.strip().lower(): name for name in names}
+    strategies = {}
+    for key, strategy in reply.items():
+        name = by_name.get(str(key).strip().lower())
+        if name and isinstance(strategy, str) and strategy.strip():
+            strategies[name] = strategy.strip()
+    return strategies
+
+def get_agilisium_competitors_for_client(client_name, industry_segment=None, differentiate=True):
+    """Analyze competitors for Agilisium using the shared competitor index
+    
+    The competitor profiles are shared by every client in an industry segment;
+    only the "How Agilisium can stand out" lines are tailored per client, with
+    one short Gemini call when differentiate is set and the latency budget allows.
+    """
+    segment = industry_segment or lookup_segment(client_name)
+    profiles = competitor_index.get_profiles(segment)[:3]
+    if not profiles:
+        return generate_client_competitor_landscape(client_name)
+    
+    strategies = {}
+    remaining = time_remaining()
+    if differentiate and (remaining is None or remaining >= DIFFERENTIATION_MIN_SECONDS):
+        strategies = differentiate_for_client(client_name, profiles)
+    
+    print(f"[NLP] Using {segment} competitor profiles for {client_name}")
+    sections = []
+    for number, profile in enumerate(profiles, 1):
+        strategy = strategies.get(profile['name']) or profile.get('differentiation', '')
+        sections.append(f"""• Competitor {number}: {profile['name']}
+• Services offered to client: {profile.get('services', '')}
+• Strengths: {', '.join(profile.get('strengths', []))}
+• Weaknesses: {', '.join(profile.get('weaknesses', []))}
+• How Agilisium can stand out: {strategy}""")
+    return "\n\n".join(sections)
 
-def get_agilisium_competitors_for_client(client_name):
-    """Analyze competitors for Agilisium using Gemini"""
+def generate_client_competitor_landscape(client_name):
+    """Analyze competitors for Agilisium from scratch using Gemini"""
     prompt = f"""
     You're working at Agilisium Consulting and your client is {client_name}.
     
@@ -183,12 +340,13 @@ def get_agilisium_competitors_for_client(client_name):
     
     print("[NLP] Analyzing competitors for Agilisium...")
     try:
-        client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+        client = get_model()
         response = client.models.generate_content(model="gemini-2.5-flash", contents=prompt)
-        return response.text if response.text else "No response received"
+        return response.text if response.text else AI_NO_RESPONSE
     except Exception as e:
+        raise_if_out_of_time(e)
         print(f"[NLP] Error during competitor analysis: {e}")
-        return f"Error during AI processing: {str(e)}"
+        return f"{AI_ERROR_PREFIX} {str(e)}"
 
 def generate_product_analysis(company_name, raw_text):
     """Generate product analysis using Gemini"""
@@ -218,9 +376,10 @@ def generate_product_analysis(company_name, raw_text):
     
     print("[NLP] Generating product analysis...")
     try:
-        client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+        client = get_model()
         response = client.models.generate_content(model="gemini-2.5-flash", contents=prompt)
-        return response.text if response.text else "No response received"
+        return response.text if response.text else AI_NO_RESPONSE
     except Exception as e:
+        raise_if_out_of_time(e)
         print(f"[NLP] Error during product analysis: {e}")
-        return f"Error during AI processing: {str(e)}"
+        return f"{AI_ERROR_PREFIX} {str(e)}"
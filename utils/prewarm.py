@@ -0,0 +1,150 @@
+"""
+Background pre-warming of watchlist analyses for Prelytics platform
+"""
+import datetime
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.analysis_cache import cache_key
+from utils.error_handler import logger
+
+def load_watchlist(path):
+    """Load a watchlist JSON file: a list of {"company_name", "company_url"} objects"""
+    if not path or not os.path.exists(path):
+        return []
+    try:
+        with open(path, encoding='utf-8') as f:
+            entries = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"[Prewarm] Could not load watchlist {path}: {e}")
+        return []
+    return [
+        (entry['company_name'], entry['company_url'])
+        for entry in entries
+        if entry.get('company_name') and entry.get('company_url')
+    ]
+
+def parse_hours(value):
+    """Parse an hour window such as "1-6" into a (start, end) tuple; None if unset or invalid"""
+    if not value:
+        return None
+    start, _, end = value.partition('-')
+    try:
+        hours = int(start), int(end or start)
+    except ValueError:
+        hours = None
+    if not hours or not all(0 <= hour <= 24 for hour in hours):
+        logger.error(f"[Prewarm] Ignoring invalid off-peak hours {value!r}; expected e.g. '1-6'")
+        return None
+    return hours
+
+class PrewarmScheduler:
+    """Refreshes cached analyses for a watchlist of companies in the background.
+
+    refresh_func(company_name, company_url, sections) must run the analysis
+    for the given sections (None means all) and store the result in the cache.
+    """
+
+    def __init__(self, cache, refresh_func, watchlist=None, max_workers=2,
+                 poll_interval=300, off_peak_hours=None):
+        self.cache = cache
+        self.refresh_func = refresh_func
+        self.watchlist = dict((cache_key(name), (name, url)) for name, url in (watchlist or []))
+        self.poll_interval = poll_interval
+        self.off_peak_hours = off_peak_hours
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prewarm")
+        self.periodic_tasks = []
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, company_name, company_url):
+        """Add a company to the watchlist"""
+        self.watchlist[cache_key(company_name)] = (company_name, company_url)
+
+    def is_off_peak(self, now=None):
+        """Whether watchlist refreshes are allowed to run right now"""
+        if not self.off_peak_hours:
+            return True
+        hour = (now or datetime.datetime.now()).hour
+        start, end = self.off_peak_hours
+        if start <= end:
+            return start <= hour < end
+        return hour >= start or hour < end
+
+    def add_periodic_task(self, name, func):
+        """Run func (no arguments) on every off-peak scheduler pass"""
+        self.periodic_tasks.append((name, func))
+
+    def _submit(self, key, label, func, *args):
+        """Queue func on the worker pool unless a job with the same key is running"""
+        with self._lock:
+            if key in self._in_flight:
+                return False
+            self._in_flight.add(key)
+        self._executor.submit(self._run, key, label, func, *args)
+        return True
+
+    def _run(self, key, label, func, *args):
+        try:
+            func(*args)
+        except Exception as e:
+            logger.error(f"[Prewarm] {label} failed: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(key)
+
+    def trigger_refresh(self, company_name, company_url, sections=None):
+        """Queue a background refresh; returns False if one is already running"""
+        queued = self._submit(cache_key(company_name), f"Refresh for {company_name}",
+                              self.refresh_func, company_name, company_url, sections)
+        if queued:
+            print(f"[Prewarm] Queued refresh for {company_name}: {sections or 'all sections'}")
+        return queued
+
+    def run_pending(self):
+        """Queue periodic tasks and refreshes for every watchlist company with stale sections"""
+        if not self.is_off_peak():
+            return 0
+        queued = 0
+        for name, func in self.periodic_tasks:
+            if self._submit(f"task:{name}", name, func):
+                queued += 1
+        for company_name, company_url in list(self.watchlist.values()):
+            stale = self.cache.stale_sections(company_name, company_url)
+            if not stale:
+                continue
+            sections = None if not self.cache.get(company_name, company_url) else stale
+            if self.trigger_refresh(company_name, company_url, sections):
+                queued += 1
+        return queued
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_pending()
+            except Exception as e:
+                logger.error(f"[Prewarm] Scheduler pass failed: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def run_forever(self):
+        """Run the scheduler loop in the calling thread (for a dedicated process)"""
+        print(f"[Prewarm] Scheduler running for {len(self.watchlist)} watchlist companies")
+        self._loop()
+
+    def start(self):
+        """Start the background scheduler thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="prewarm-scheduler", daemon=True)
+        self._thread.start()
+        print(f"[Prewarm] Scheduler started for {len(self.watchlist)} watchlist companies")
+
+    def stop(self):
+        """Stop the scheduler thread and wait for queued refreshes"""
+        self._stop.set()
+        self._executor.shutdown(wait=True)
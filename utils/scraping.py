@@ -1,5 +1,8 @@
 import requests
 from bs4 import BeautifulSoup
+from utils.deadline import time_remaining
+
+REQUEST_TIMEOUT = 6
 
 def scrape_company_pages(base_url, extra_paths=None):
     headers = {"User-Agent": "Mozilla/5.0"}
@@ -13,10 +16,18 @@ def scrape_company_pages(base_url, extra_paths=None):
     scraped_text = ""
 
     for path in paths_to_try:
+        # Under a latency budget, only the homepage is always fetched; the
+        # extra paths are skipped once there is no time for a full request
+        remaining = time_remaining()
+        if remaining is not None and path and remaining < REQUEST_TIMEOUT:
+            print("[Scraper] Latency budget nearly spent, skipping remaining paths")
+            break
+
         full_url = base_url.rstrip("/") + path
         try:
             print(f"[Scraper] Trying: {full_url}")
-            response = requests.get(full_url, headers=headers, timeout=6)
+            timeout = REQUEST_TIMEOUT if remaining is None else max(1, min(REQUEST_TIMEOUT, remaining))
+            response = requests.get(full_url, headers=headers, timeout=timeout)
             if response.status_code == 200:
                 soup = BeautifulSoup(response.text, "html.parser")
                 text = soup.get_text(separator=" ", strip=True)